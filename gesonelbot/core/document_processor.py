@@ -403,6 +403,9 @@ def ingest_documents(file_paths: Optional[List[str]] = None) -> Dict[str, object
     """
     Processa documentos e os adiciona ao banco de dados vetorial.
     
+    Pode ser chamada várias vezes em sequência (por exemplo, em lotes): os chunks
+    de cada chamada são acrescentados ao banco de dados vetorial existente.
+    
     Args:
         file_paths: Lista opcional de caminhos para os arquivos a processar.
                     Se None, processa todos os arquivos no diretório de upload.
@@ -7,11 +7,12 @@ utilizando o modelo TinyLlama localmente.
 import os
 import logging
 import json
-from typing import Dict, Any, Optional, Union, List
+import threading
+from typing import Dict, Any, Optional, Union, List, Iterator
 
 # Importações necessárias para o modelo local
 import torch
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline, BitsAndBytesConfig
+from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline, BitsAndBytesConfig, TextIteratorStreamer
 
 # Configurações
 from gesonelbot.config.settings import (
@@ -28,6 +29,9 @@ from gesonelbot.config.settings import (
 # Configurar logging
 logger = logging.getLogger(__name__)
 
+# Mensagem exibida quando o modelo gera uma resposta vazia ou muito curta
+EMPTY_RESPONSE_MESSAGE = "Desculpe, não consegui gerar uma resposta adequada. O modelo TinyLlama pode ter limitações para este tipo de consulta."
+
 class LLMManager:
     """
     Gerencia o modelo de linguagem para geração de texto.
@@ -46,6 +50,9 @@ class LLMManager:
         self.generator = None
         self.model_info = {}
         
+        # Evita carregar o modelo duas vezes quando chegam perguntas simultâneas
+        self._load_lock = threading.Lock()
+        
         # Verificar configurações iniciais
         logger.info(f"Inicializando LLM Manager com modelo local: {LOCAL_MODEL_NAME}")
     
@@ -181,6 +188,59 @@ class LLMManager:
         formatted_prompt = f"<|system|>\n{system_prompt}\n<|user|>\n{prompt}\n<|assistant|>"
         return formatted_prompt
     
+    def _ensure_model_loaded(self) -> bool:
+        """
+        Carrega o modelo sob demanda, uma única vez mesmo com chamadas simultâneas.
+        
+        Returns:
+            bool: True se o modelo está pronto para uso
+        """
+        if not self.current_model or not self.tokenizer or not self.generator:
+            with self._load_lock:
+                if not self.current_model or not self.tokenizer or not self.generator:
+                    logger.info("Modelo não carregado. Carregando modelo...")
+                    return self.load_model()
+        return True
+    
+    def _prepare_generation(self, prompt: str, **kwargs) -> tuple:
+        """
+        Formata o prompt e monta os parâmetros de geração.
+        
+        Args:
+            prompt: O prompt para o modelo
+            **kwargs: Parâmetros adicionais para a geração (temperatura, max_tokens, etc.)
+        
+        Returns:
+            tuple: (prompt formatado, parâmetros de geração)
+        """
+        # Parâmetros para a geração
+        temperature = kwargs.get("temperature", QA_TEMPERATURE)
+        max_tokens = kwargs.get("max_tokens", QA_MAX_TOKENS)
+        
+        # Usar o sistema prompt personalizado se fornecido, caso contrário usar o padrão
+        system_prompt = kwargs.get("system_prompt", SYSTEM_TEMPLATE.format(app_name="GesonelBot"))
+        
+        # Formatar o prompt para o modelo
+        formatted_prompt = self.format_prompt_for_model(prompt, system_prompt)
+        
+        logger.info(f"Enviando prompt para modelo local: {LOCAL_MODEL_NAME}")
+        logger.info(f"Parâmetros da chamada: temperatura={temperature}, max_tokens={max_tokens}")
+        logger.debug(f"Prompt completo: {formatted_prompt[:500]}...")
+        
+        # Gerar resposta com configurações otimizadas para evitar travamentos
+        generation_config = {
+            "max_new_tokens": min(max_tokens, 256),  # Limitar para evitar problemas
+            "temperature": temperature,
+            "top_p": 0.9,
+            "do_sample": temperature > 0.0,
+            "pad_token_id": self.tokenizer.eos_token_id,
+            "num_return_sequences": 1,
+            "repetition_penalty": 1.2,  # Evitar repetições
+            "no_repeat_ngram_size": 3  # Evitar repetição de n-gramas
+        }
+        
+        return formatted_prompt, generation_config
+    
     def generate_response(self, prompt: str, **kwargs) -> str:
         """
         Gera uma resposta usando o modelo carregado.
@@ -193,40 +253,12 @@ class LLMManager:
             str: A resposta gerada pelo modelo
         """
         # Verificar se o modelo está carregado
-        if not self.current_model or not self.tokenizer or not self.generator:
-            logger.info("Modelo não carregado. Carregando modelo...")
-            success = self.load_model()
-            
-            if not success:
-                return "Erro: Não foi possível carregar o modelo local. Verifique os logs para mais detalhes."
+        if not self._ensure_model_loaded():
+            return "Erro: Não foi possível carregar o modelo local. Verifique os logs para mais detalhes."
         
         # Gerar resposta
         try:
-            # Parâmetros para a geração
-            temperature = kwargs.get("temperature", QA_TEMPERATURE)
-            max_tokens = kwargs.get("max_tokens", QA_MAX_TOKENS)
-            
-            # Usar o sistema prompt personalizado se fornecido, caso contrário usar o padrão
-            system_prompt = kwargs.get("system_prompt", SYSTEM_TEMPLATE.format(app_name="GesonelBot"))
-            
-            # Formatar o prompt para o modelo
-            formatted_prompt = self.format_prompt_for_model(prompt, system_prompt)
-            
-            logger.info(f"Enviando prompt para modelo local: {LOCAL_MODEL_NAME}")
-            logger.info(f"Parâmetros da chamada: temperatura={temperature}, max_tokens={max_tokens}")
-            logger.debug(f"Prompt completo: {formatted_prompt[:500]}...")
-            
-            # Gerar resposta com configurações otimizadas para evitar travamentos
-            generation_config = {
-                "max_new_tokens": min(max_tokens, 256),  # Limitar para evitar problemas
-                "temperature": temperature,
-                "top_p": 0.9,
-                "do_sample": temperature > 0.0,
-                "pad_token_id": self.tokenizer.eos_token_id,
-                "num_return_sequences": 1,
-                "repetition_penalty": 1.2,  # Evitar repetições
-                "no_repeat_ngram_size": 3  # Evitar repetição de n-gramas
-            }
+            formatted_prompt, generation_config = self._prepare_generation(prompt, **kwargs)
             
             output = self.generator(
                 formatted_prompt,
@@ -241,7 +273,7 @@ class LLMManager:
             
             # Verificar se a resposta está vazia ou muito curta
             if not response or len(response) < 5:
-                return "Desculpe, não consegui gerar uma resposta adequada. O modelo TinyLlama pode ter limitações para este tipo de consulta."
+                return EMPTY_RESPONSE_MESSAGE
                 
             return response
                 
@@ -252,6 +284,60 @@ class LLMManager:
             logger.error(f"Traceback: {error_traceback}")
             return f"Erro ao gerar resposta: {str(e)}"
     
+    def generate_response_stream(self, prompt: str, timeout: Optional[float] = None, **kwargs) -> Iterator[str]:
+        """
+        Gera uma resposta usando o modelo carregado, produzindo o texto aos poucos.
+        
+        Args:
+            prompt: O prompt para o modelo
+            timeout: Tempo máximo de espera por cada novo trecho, em segundos
+                     (queue.Empty é lançada se for excedido)
+            **kwargs: Parâmetros adicionais para a geração (temperatura, max_tokens, etc.)
+        
+        Yields:
+            str: A resposta acumulada até o momento
+        """
+        # Verificar se o modelo está carregado
+        if not self._ensure_model_loaded():
+            yield "Erro: Não foi possível carregar o modelo local. Verifique os logs para mais detalhes."
+            return
+        
+        formatted_prompt, generation_config = self._prepare_generation(prompt, **kwargs)
+        
+        # O streamer recebe apenas os tokens novos, sem repetir o prompt
+        streamer = TextIteratorStreamer(
+            self.tokenizer,
+            skip_prompt=True,
+            skip_special_tokens=True,
+            timeout=timeout
+        )
+        inputs = self.tokenizer(formatted_prompt, return_tensors="pt").to(self.current_model.device)
+        errors = []
+        
+        def target_function():
+            try:
+                self.current_model.generate(**inputs, streamer=streamer, **generation_config)
+            except Exception as e:
+                logger.error(f"Erro ao gerar resposta: {str(e)}")
+                errors.append(e)
+                # Encerrar o streamer para não bloquear o consumidor
+                streamer.end()
+        
+        thread = threading.Thread(target=target_function)
+        thread.daemon = True
+        thread.start()
+        
+        response = ""
+        for new_text in streamer:
+            response += new_text
+            yield response.strip()
+        
+        if errors:
+            yield f"Erro ao gerar resposta: {str(errors[0])}"
+        elif len(response.strip()) < 5:
+            # Mesma verificação de resposta vazia ou muito curta de generate_response
+            yield EMPTY_RESPONSE_MESSAGE
+    
     def get_model_info(self) -> Dict[str, Any]:
         """
         Retorna informações sobre o modelo atual.
@@ -10,7 +10,7 @@ import time
 import re
 import threading
 import queue
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Union, Tuple, Iterator
 
 # Componentes do GesonelBot
 from gesonelbot.core.retriever import document_retriever
@@ -90,6 +90,12 @@ Pergunta: {question}
 # Tempo máximo para geração de resposta (em segundos)
 RESPONSE_TIMEOUT = 60
 
+# Mensagem exibida quando nenhum documento relevante é encontrado
+NO_DOCUMENTS_MESSAGE = "Não encontrei informações relevantes para responder a esta pergunta nos documentos carregados."
+
+# Mensagem exibida quando a geração excede RESPONSE_TIMEOUT
+TIMEOUT_MESSAGE = "Desculpe, a geração da resposta está demorando muito tempo. O modelo TinyLlama pode ter dificuldades para processar documentos complexos. Por favor, tente uma pergunta mais simples ou específica."
+
 def generate_response_with_timeout(prompt, temperature, max_tokens, system_prompt, timeout=RESPONSE_TIMEOUT):
     """
     Gera uma resposta com um timeout para evitar bloqueios.
@@ -128,7 +134,7 @@ def generate_response_with_timeout(prompt, temperature, max_tokens, system_promp
             return f"Erro ao gerar resposta: {result}"
         return result
     except queue.Empty:
-        return "Desculpe, a geração da resposta está demorando muito tempo. O modelo TinyLlama pode ter dificuldades para processar documentos complexos. Por favor, tente uma pergunta mais simples ou específica."
+        return TIMEOUT_MESSAGE
 
 def is_greeting(text: str) -> bool:
     """
@@ -159,6 +165,58 @@ def get_greeting_response() -> str:
     import random
     return random.choice(GREETING_RESPONSES)
 
+def build_qa_prompt(question: str, retrieved_docs: List[Dict[str, Any]]) -> Tuple[str, List[Dict[str, str]]]:
+    """
+    Monta o prompt de QA a partir dos documentos recuperados.
+    
+    Args:
+        question: A pergunta do usuário
+        retrieved_docs: Documentos retornados pelo retriever
+        
+    Returns:
+        Tupla (prompt formatado, lista de fontes)
+    """
+    # Preparar os contextos para o prompt
+    contexts = []
+    sources = []
+    
+    for i, doc in enumerate(retrieved_docs):
+        # Extrair informações do documento
+        file_name = doc.get("file_name", f"Documento {i+1}")
+        source = doc.get("source", f"Fonte {i+1}")
+        content = doc.get("content", "").strip()
+        
+        # Limitar o tamanho do conteúdo para evitar sobrecarregar o modelo
+        if len(content) > 1000:
+            content = content[:1000] + "... (conteúdo truncado)"
+        
+        # Formatar o conteúdo do documento de forma clara
+        formatted_content = f"""DOCUMENTO {i+1}: {file_name}
+{content}
+"""
+        contexts.append(formatted_content)
+        
+        # Coletar informações da fonte
+        source_info = {
+            "file_name": file_name,
+            "source": source
+        }
+        sources.append(source_info)
+    
+    # Juntar todos os contextos com separadores claros
+    all_contexts = "\n\n" + "\n\n".join(contexts)
+    
+    # Selecionar o template de prompt
+    prompt_template = PROMPT_TEMPLATES.get(QA_PROMPT_TEMPLATE, PROMPT_TEMPLATES["padrao"])
+    
+    # Formatar o prompt com os contextos e a pergunta
+    prompt = prompt_template.format(
+        contexts=all_contexts,
+        question=question
+    )
+    
+    return prompt, sources
+
 def answer_question(question: str, top_k: int = None) -> Dict[str, Any]:
     """
     Responde uma pergunta com base nos documentos armazenados.
@@ -209,7 +267,7 @@ def answer_question(question: str, top_k: int = None) -> Dict[str, Any]:
             logger.warning("Nenhum documento relevante encontrado para a pergunta")
             return {
                 "question": question,
-                "answer": "Não encontrei informações relevantes para responder a esta pergunta nos documentos carregados.",
+                "answer": NO_DOCUMENTS_MESSAGE,
                 "sources": [],
                 "metadata": {
                     "retrieved_documents": 0,
@@ -221,44 +279,8 @@ def answer_question(question: str, top_k: int = None) -> Dict[str, Any]:
         if top_k is not None:
             retrieved_docs = retrieved_docs[:top_k]
         
-        # Preparar os contextos para o prompt
-        contexts = []
-        sources = []
-        
-        for i, doc in enumerate(retrieved_docs):
-            # Extrair informações do documento
-            file_name = doc.get("file_name", f"Documento {i+1}")
-            source = doc.get("source", f"Fonte {i+1}")
-            content = doc.get("content", "").strip()
-            
-            # Limitar o tamanho do conteúdo para evitar sobrecarregar o modelo
-            if len(content) > 1000:
-                content = content[:1000] + "... (conteúdo truncado)"
-            
-            # Formatar o conteúdo do documento de forma clara
-            formatted_content = f"""DOCUMENTO {i+1}: {file_name}
-{content}
-"""
-            contexts.append(formatted_content)
-            
-            # Coletar informações da fonte
-            source_info = {
-                "file_name": file_name,
-                "source": source
-            }
-            sources.append(source_info)
-        
-        # Juntar todos os contextos com separadores claros
-        all_contexts = "\n\n" + "\n\n".join(contexts)
-        
-        # Selecionar o template de prompt
-        prompt_template = PROMPT_TEMPLATES.get(QA_PROMPT_TEMPLATE, PROMPT_TEMPLATES["padrao"])
-        
-        # Formatar o prompt com os contextos e a pergunta
-        prompt = prompt_template.format(
-            contexts=all_contexts,
-            question=question
-        )
+        # Montar o prompt com os documentos recuperados
+        prompt, sources = build_qa_prompt(question, retrieved_docs)
         
         # Log do prompt para debug
         logger.debug(f"Prompt completo: {prompt[:500]}...")
@@ -306,6 +328,59 @@ def answer_question(question: str, top_k: int = None) -> Dict[str, Any]:
             }
         }
 
+def answer_question_stream(question: str, top_k: int = None) -> Iterator[str]:
+    """
+    Responde uma pergunta como answer_question, mas produz a resposta aos poucos.
+    
+    Saudações, perguntas vazias e perguntas sem documentos relevantes produzem
+    a resposta completa de uma só vez.
+    
+    Args:
+        question: A pergunta do usuário
+        top_k: Número máximo de resultados a usar (opcional, usa o padrão se None)
+        
+    Yields:
+        str: A resposta acumulada até o momento
+    """
+    # Perguntas que não passam pelo modelo são respondidas de uma vez
+    if not question or len(question.strip()) == 0 or is_greeting(question):
+        yield answer_question(question, top_k)["answer"]
+        return
+    
+    logger.info(f"Processando pergunta (streaming): '{question}'")
+    
+    try:
+        # Recuperar documentos relevantes usando o retriever
+        retrieved_docs = document_retriever.search(question)
+        
+        if not retrieved_docs:
+            logger.warning("Nenhum documento relevante encontrado para a pergunta")
+            yield NO_DOCUMENTS_MESSAGE
+            return
+        
+        # Limitar o número de documentos se top_k for especificado
+        if top_k is not None:
+            retrieved_docs = retrieved_docs[:top_k]
+        
+        prompt, _ = build_qa_prompt(question, retrieved_docs)
+        logger.debug(f"Prompt completo: {prompt[:500]}...")
+        
+        # O timeout se aplica à espera por cada novo trecho da resposta
+        yield from llm_manager.generate_response_stream(
+            prompt,
+            timeout=RESPONSE_TIMEOUT,
+            temperature=QA_TEMPERATURE,
+            max_tokens=QA_MAX_TOKENS,
+            system_prompt=SYSTEM_PROMPT
+        )
+    except queue.Empty:
+        yield TIMEOUT_MESSAGE
+    except Exception as e:
+        logger.error(f"Erro ao responder pergunta: {str(e)}")
+        import traceback
+        logger.error(f"Traceback: {traceback.format_exc()}")
+        yield f"Ocorreu um erro ao processar sua pergunta: {str(e)}"
+
 def list_available_documents() -> List[Dict[str, str]]:
     """
     Lista os documentos disponíveis para consulta.
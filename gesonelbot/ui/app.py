@@ -6,6 +6,12 @@ o upload de documentos e a interação com perguntas e respostas.
 """
 import os
 import sys
+import gc
+import random
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # Patch para contornar o erro de pyaudioop no Python 3.13+
 import sys
@@ -44,7 +50,7 @@ if importlib.util.find_spec("audioop") is None:
 
 import gradio as gr
 from gesonelbot.core.document_processor import ingest_documents, get_total_upload_usage
-from gesonelbot.core.qa_engine import answer_question as qa_answer
+from gesonelbot.core.qa_engine import answer_question_stream as qa_answer_stream
 from gesonelbot.core.qa_engine import get_model_info, list_available_models
 from gesonelbot.core.settings_manager import settings_manager
 from gesonelbot.core.llm_manager import llm_manager
@@ -57,236 +63,393 @@ from gesonelbot.config.settings import LOCAL_MODEL_NAME
 # Definir configurações de limites de upload que não estão presentes no settings.py
 MAX_FILE_SIZE_MB = 20  # Tamanho máximo de arquivo em MB
 MAX_FILES = 10         # Número máximo de arquivos permitidos
+INGEST_BATCH_SIZE = 4 # Número de arquivos indexados por chamada a ingest_documents (menor que MAX_FILES)
 
 # Fixar o diretório de upload como caminho absoluto
 UPLOAD_DIR = os.path.abspath(SETTINGS_UPLOAD_DIR)
 
+# Valores derivados calculados uma única vez
+MAX_FILE_SIZE_BYTES = MAX_FILE_SIZE_MB * 1024 * 1024
+_COPY_BUFSIZE = 256 * 1024  # Tamanho do bloco para cópias em espaço de usuário
+_UPLOAD_SEP = UPLOAD_DIR + os.sep
+_ALLOWED_EXTS = frozenset({'.pdf', '.docx', '.txt'})
+
+# Exemplos de perguntas usados pelo botão "Pergunta Exemplo"
+_EXAMPLES = (
+    "O que é mencionado sobre...?",
+    "Quais são os principais tópicos abordados?",
+    "Poderia resumir o documento?",
+    "Qual é a conclusão do texto sobre...?",
+    "Existe alguma menção a...?"
+)
+
+# Configurar logging
+logger = logging.getLogger(__name__)
+
 # Função para atualizar informações de armazenamento (movida para o início do arquivo)
 def update_storage_info():
-    current_size, current_files = get_directory_size()
+    return format_storage_info(*get_directory_size())
+
+def format_storage_info(current_size, current_files):
     return f"### Estado atual do sistema\n📊 **Uso de armazenamento:** {current_size:.2f}MB de {MAX_FILE_SIZE_MB}MB\n📁 **Arquivos:** {current_files} de {MAX_FILES}"
 
 # Garantir que as pastas existam
-print(f"Diretório de upload configurado: {UPLOAD_DIR}")
+logger.debug(f"Diretório de upload configurado: {UPLOAD_DIR}")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(VECTORSTORE_DIR, exist_ok=True)
 
-# Escrever um arquivo de teste para verificar permissões
-try:
-    test_file_path = os.path.join(UPLOAD_DIR, "test_write.txt")
-    with open(test_file_path, 'w') as f:
-        f.write("Teste de escrita")
-    if os.path.exists(test_file_path):
-        os.remove(test_file_path)
-        print(f"Teste de escrita no diretório {UPLOAD_DIR} bem-sucedido")
-    else:
-        print(f"Falha no teste de escrita - arquivo não foi criado em {UPLOAD_DIR}")
-except Exception as e:
-    print(f"Erro ao testar escrita no diretório {UPLOAD_DIR}: {str(e)}")
+# Dispositivo do diretório de upload, para detectar origens no mesmo sistema de arquivos
+_UPLOAD_DEV = os.stat(UPLOAD_DIR).st_dev
+
+# Cache de (tamanho, número de arquivos) do diretório de upload, invalidado pelo mtime.
+# "version" muda a cada escrita, para descartar varreduras que a atravessaram
+_dir_cache = {"mtime": -1, "size": 0.0, "count": 0, "version": 0}
+
+# Serializa os uploads: a fila do Gradio executa até 4 eventos ao mesmo tempo e o
+# limite de arquivos, a cópia e a indexação não podem se intercalar entre dois uploads
+_upload_lock = threading.Lock()
+
+def _invalidate_dir_cache():
+    """
+    Descarta o tamanho em cache após uma escrita no diretório de upload.
+    
+    Sobrescrever um arquivo existente não altera o mtime do diretório, por isso
+    save_file precisa invalidar o cache explicitamente depois de cada cópia.
+    """
+    _dir_cache["mtime"] = -1
+    _dir_cache["version"] += 1
 
 def get_directory_size():
     """
     Calcula o tamanho total dos arquivos no diretório de upload.
     
+    O resultado é reaproveitado enquanto o mtime do diretório não mudar.
+    
     Retorna:
         tuple: (tamanho em MB, número de arquivos)
     """
-    # Checar se o diretório existe
-    if not os.path.exists(UPLOAD_DIR):
-        print(f"Diretório de upload não existe: {UPLOAD_DIR}")
+    # Checar se o diretório existe e obter seu mtime para o cache
+    try:
+        mtime = os.stat(UPLOAD_DIR).st_mtime_ns
+    except FileNotFoundError:
+        logger.debug(f"Diretório de upload não existe: {UPLOAD_DIR}")
         os.makedirs(UPLOAD_DIR, exist_ok=True)
+        _dir_cache["mtime"] = -1
         return 0.0, 0
     
+    # Reutilizar o resultado anterior se o diretório não mudou
+    if mtime == _dir_cache["mtime"]:
+        return _dir_cache["size"], _dir_cache["count"]
+    
+    version = _dir_cache["version"]
     total_size = 0
     file_count = 0
     
-    # Listar explicitamente arquivos no diretório (apenas nível principal)
-    print(f"Verificando arquivos em: {UPLOAD_DIR}")
+    # Listar arquivos no diretório (apenas nível principal) reaproveitando os dados do scandir
     try:
-        for filename in os.listdir(UPLOAD_DIR):
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            if os.path.isfile(file_path):
-                file_size = os.path.getsize(file_path)
-                total_size += file_size
-                file_count += 1
-                print(f"Arquivo encontrado: {filename}, Tamanho: {file_size/1024/1024:.2f}MB")
+        with os.scandir(UPLOAD_DIR) as entries:
+            for entry in entries:
+                if entry.is_file(follow_symlinks=False):
+                    total_size += entry.stat(follow_symlinks=False).st_size
+                    file_count += 1
     except Exception as e:
-        print(f"Erro ao listar arquivos: {str(e)}")
-        import traceback
-        print(traceback.format_exc())
+        logger.debug(f"Erro ao listar arquivos: {str(e)}", exc_info=True)
+        return total_size / (1024 * 1024), file_count
+    
+    # Atualizar o cache, a menos que uma escrita tenha ocorrido durante a varredura
+    if version == _dir_cache["version"]:
+        _dir_cache["mtime"] = mtime
+        _dir_cache["size"] = total_size / (1024 * 1024)
+        _dir_cache["count"] = file_count
     
     # Mostrar resultado final
-    print(f"Total: {total_size/1024/1024:.2f}MB, {file_count} arquivo(s)")
+    logger.debug(f"Total em {UPLOAD_DIR}: {total_size/1024/1024:.2f}MB, {file_count} arquivo(s)")
     return total_size / (1024 * 1024), file_count
 
-def save_file(files):
+# Função de extração escolhida para cada tipo de objeto de arquivo do Gradio
+_upload_extractors = {}
+
+def _extract_named_file(file_obj):
+    """
+    Extrai caminho e nome de objetos file-like que só expõem o atributo name.
+    """
+    source_path = str(file_obj.name)
+    return (source_path if os.path.exists(source_path) else None), os.path.basename(source_path)
+
+def _select_extractor(file_obj):
+    """
+    Escolhe a função de extração adequada ao formato do objeto de arquivo.
+    
+    Parâmetros:
+        file_obj: Objeto de arquivo do Gradio usado como amostra
+        
+    Retorna:
+        function: Função file_obj -> (caminho de origem, nome do arquivo), ou None se o formato for desconhecido
+    """
+    if hasattr(file_obj, 'name') and hasattr(file_obj, 'orig_name'):
+        # Formato típico da versão 3.50.2: caminho temporário e nome original
+        return lambda f: (f.name, f.orig_name)
+    if isinstance(file_obj, tuple):
+        # Algumas versões do Gradio retornam tuplas (caminho, nome)
+        return lambda f: f
+    if isinstance(file_obj, str):
+        # Pode ser simplesmente um caminho de arquivo
+        return lambda f: (f, os.path.basename(f))
+    if hasattr(file_obj, 'name'):
+        # Objetos file-like (Gradio mais recente)
+        return _extract_named_file
+    return None
+
+def _extract_upload(file_obj):
+    """
+    Extrai o caminho temporário e o nome original de um arquivo enviado.
+    
+    A função de extração é escolhida uma vez por tipo de objeto e reutilizada.
+    
+    Parâmetros:
+        file_obj: Objeto de arquivo do Gradio
+        
+    Retorna:
+        tuple: (caminho de origem, nome do arquivo), ou None se o formato for desconhecido
+    """
+    extractor = _upload_extractors.get(type(file_obj))
+    if extractor is None:
+        extractor = _select_extractor(file_obj)
+        if extractor is None:
+            return None
+        _upload_extractors[type(file_obj)] = extractor
+    return extractor(file_obj)
+
+def _copy_upload(source_path, final_path, source_dev):
+    """
+    Coloca o arquivo de origem no caminho final pelo meio mais barato disponível.
+    
+    No mesmo sistema de arquivos cria um hard link (operação apenas de metadados),
+    preservando o arquivo temporário que o Gradio ainda pode reutilizar. Se o link
+    não for possível, tenta os.copy_file_range (Linux), que permite reflink em
+    btrfs/xfs e cópia no servidor em NFSv4.2. Nos demais casos usa shutil.copyfile,
+    que já recorre a sendfile no kernel.
+    
+    Parâmetros:
+        source_path (str): Caminho temporário do arquivo enviado
+        final_path (str): Caminho de destino no UPLOAD_DIR
+        source_dev (int): st_dev do arquivo de origem
+    """
+    if source_dev == _UPLOAD_DEV:
+        try:
+            if os.path.lexists(final_path):
+                os.remove(final_path)
+            os.link(source_path, final_path)
+            return
+        except OSError as e:
+            logger.debug(f"Não foi possível criar hard link para {final_path}: {str(e)}")
+        
+        # copy_file_range entre sistemas de arquivos diferentes falha com EXDEV
+        # nos kernels recentes, por isso só é tentado no mesmo dispositivo
+        if hasattr(os, 'copy_file_range') and _copy_file_range(source_path, final_path):
+            return
+    
+    shutil.copyfile(source_path, final_path)  # Usar copyfile em vez de copy2
+
+def _copy_file_range(source_path, final_path):
+    """
+    Copia um arquivo com os.copy_file_range, sem passar os dados pelo espaço de usuário.
+    
+    Parâmetros:
+        source_path (str): Caminho do arquivo de origem
+        final_path (str): Caminho de destino
+        
+    Retorna:
+        bool: True se a cópia foi concluída, False se a chamada não é suportada
+              (nenhum byte foi copiado e o chamador deve usar outro método)
+    """
+    src_fd = os.open(source_path, os.O_RDONLY)
+    try:
+        dst_fd = os.open(final_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            remaining = os.fstat(src_fd).st_size
+            copied_total = 0
+            try:
+                # Copiar até o fim do arquivo; a chamada pode transferir menos que o pedido
+                while True:
+                    copied = os.copy_file_range(src_fd, dst_fd, max(remaining, _COPY_BUFSIZE))
+                    if copied == 0:
+                        # Sem nenhum byte copiado (ex.: /proc ou FUSE), usar outro método
+                        if copied_total == 0:
+                            return False
+                        break
+                    copied_total += copied
+                    remaining -= copied
+            except OSError as e:
+                logger.debug(f"copy_file_range falhou para {final_path}: {str(e)}")
+                if copied_total == 0:
+                    return False
+                
+                # Último recurso: falha no meio da cópia, recomeçar em espaço de usuário
+                os.lseek(src_fd, 0, os.SEEK_SET)
+                os.lseek(dst_fd, 0, os.SEEK_SET)
+                os.ftruncate(dst_fd, 0)
+                with open(src_fd, 'rb', closefd=False) as src_file, open(dst_fd, 'wb', closefd=False) as dest_file:
+                    shutil.copyfileobj(src_file, dest_file, length=_COPY_BUFSIZE)
+        finally:
+            os.close(dst_fd)
+    finally:
+        os.close(src_fd)
+    
+    return True
+
+def _save_one(file_obj):
+    """
+    Salva um único arquivo enviado pelo usuário no diretório de upload.
+    
+    Parâmetros:
+        file_obj: Objeto de arquivo do Gradio
+        
+    Retorna:
+        tuple: (sucesso, caminho final do arquivo ou mensagem de erro)
+    """
+    file_name = None
+    try:
+        # Extrair o caminho de origem e o nome original do arquivo
+        extracted = _extract_upload(file_obj)
+        if extracted is None:
+            return False, f"❌ Não foi possível identificar o arquivo. Formato desconhecido: {type(file_obj)}"
+        source_path, file_name = extracted
+        
+        # Garantir que temos apenas o nome do arquivo, não o caminho completo
+        file_name = os.path.basename(file_name)
+        
+        # Verificar se o caminho de origem existe e tem conteúdo
+        if not source_path or not os.path.exists(source_path):
+            return False, f"❌ Caminho temporário do arquivo {file_name} não encontrado."
+        
+        # Verificar o tamanho na origem, antes de qualquer cópia
+        src_stat = os.stat(source_path)
+        src_size = src_stat.st_size
+        if src_size == 0:
+            return False, f"❌ Arquivo de origem {file_name} está vazio."
+        
+        if src_size > MAX_FILE_SIZE_BYTES:
+            return False, f"⚠️ Arquivo {file_name} excede o limite de {MAX_FILE_SIZE_MB}MB"
+        
+        # Verificar formato do arquivo
+        ext = os.path.splitext(file_name)[1].lower()
+        if ext not in _ALLOWED_EXTS:
+            return False, f"⚠️ Formato de arquivo não suportado: {ext}. Use PDF, DOCX ou TXT."
+        
+        # CORRETO: Definir o caminho final no UPLOAD_DIR usando apenas o nome do arquivo
+        # Importante: Não usar os.path.join com qualquer parte do caminho temporário!
+        final_path = _UPLOAD_SEP + file_name  # Forçar a concatenação direta
+        
+        # Método seguro para salvar o arquivo no destino correto
+        try:
+            _copy_upload(source_path, final_path, src_stat.st_dev)
+        except Exception as e:
+            return False, f"❌ Falha ao copiar o arquivo {file_name}: {str(e)}"
+        finally:
+            # Invalidar depois da escrita (mesmo parcial), nunca antes dela
+            _invalidate_dir_cache()
+        
+        # Verificar se o arquivo realmente foi salvo no diretório correto
+        if not os.path.exists(final_path):
+            return False, f"❌ Arquivo não existe após tentativa de cópia: {final_path}"
+            
+        if os.path.getsize(final_path) == 0:
+            return False, f"❌ Arquivo salvo mas está vazio: {final_path}"
+        
+        logger.debug(f"Arquivo {file_name} ({type(file_obj)}) salvo de {source_path} em {final_path}")
+        
+        return True, final_path
+        
+    except Exception as e:
+        # Capturar erros detalhados
+        import traceback
+        error_details = traceback.format_exc()
+        return False, f"❌ Erro ao processar {file_name or 'arquivo'}: {str(e)}\n\nDetalhes: {error_details}"
+
+def save_file(files, progress=gr.Progress()):
     """
     Salva os arquivos enviados pelo usuário no diretório de upload e inicia o processamento.
     
+    Os arquivos são copiados em paralelo; uma falha em um arquivo não interrompe os demais.
+    A indexação é feita em lotes de INGEST_BATCH_SIZE arquivos para limitar o uso de memória.
+    Uploads simultâneos são processados um de cada vez.
+    
     Parâmetros:
         files (list): Lista de objetos de arquivo do Gradio
+        progress (gr.Progress): Indicador de progresso exibido pelo Gradio
         
     Retorna:
         tuple: (mensagem de status, atualização de armazenamento)
     """
-    # DEBUG - Imprimir o UPLOAD_DIR para verificar seu valor real
-    print(f"====> UPLOAD_DIR em save_file: {repr(UPLOAD_DIR)}")
-    print(f"====> Este é um caminho absoluto? {os.path.isabs(UPLOAD_DIR)}")
-    
     # Verificação de input
     if not files:
         return "⚠️ Nenhum arquivo selecionado. Por favor, escolha arquivos para upload.", update_storage_info()
     
-    # Lista para armazenar caminhos dos arquivos salvos
-    file_paths = []
+    with _upload_lock:
+        return _save_and_ingest(files, progress)
+
+def _save_and_ingest(files, progress):
+    """
+    Verifica o limite de arquivos, salva os arquivos e os indexa.
+    
+    Deve ser chamada com _upload_lock adquirido.
     
-    # Verificar limite de arquivos
+    Parâmetros:
+        files (list): Lista não vazia de objetos de arquivo do Gradio
+        progress (gr.Progress): Indicador de progresso exibido pelo Gradio
+        
+    Retorna:
+        tuple: (mensagem de status, atualização de armazenamento)
+    """
+    # Verificar limite de arquivos uma única vez para todo o lote
     current_size, current_files = get_directory_size()
     new_files_count = len(files)
     
-    print(f"Estado atual: {current_files} arquivos, {current_size:.2f}MB usados")
-    print(f"Diretório de upload: {UPLOAD_DIR}")
+    logger.debug(f"Estado atual de {UPLOAD_DIR}: {current_files} arquivos, {current_size:.2f}MB usados")
     
     if current_files + new_files_count > MAX_FILES:
-        return f"⚠️ Número máximo de arquivos excedido. Limite: {MAX_FILES} arquivos (atualmente: {current_files})", update_storage_info()
+        return f"⚠️ Número máximo de arquivos excedido. Limite: {MAX_FILES} arquivos (atualmente: {current_files})", format_storage_info(current_size, current_files)
     
-    # Importar o módulo de cópia de arquivos
-    import shutil
+    # Garantir que o diretório de destino exista (verificado uma vez para todo o lote)
+    if not os.path.exists(UPLOAD_DIR):
+        logger.debug(f"Recriando diretório de upload: {UPLOAD_DIR}")
+        os.makedirs(UPLOAD_DIR, exist_ok=True)
     
-    # Processar cada arquivo na lista
-    for file_obj in files:
-        try:
-            # No Gradio 3.50.2, os arquivos são objetos especiais
-            # Vamos extrair o caminho de origem e nome do arquivo
-            if hasattr(file_obj, 'name') and hasattr(file_obj, 'orig_name'):
-                # Este é o formato típico da versão 3.50.2
-                source_path = file_obj.name  # Caminho temporário do Gradio
-                file_name = file_obj.orig_name  # Nome original do arquivo
-            elif isinstance(file_obj, tuple) and len(file_obj) == 2:
-                # Algumas versões do Gradio retornam tuplas (caminho, nome)
-                source_path, file_name = file_obj
-            elif isinstance(file_obj, str) and os.path.exists(file_obj):
-                # Pode ser simplesmente um caminho de arquivo
-                source_path = file_obj
-                file_name = os.path.basename(file_obj)
-            elif hasattr(file_obj, 'name'):
-                # Tentativa para objetos file-like (Gradio mais recente)
-                file_name = os.path.basename(str(file_obj.name))
-                source_path = str(file_obj.name) if os.path.exists(str(file_obj.name)) else None
-            else:
-                # Para objetos temporários
-                try:
-                    source_path = file_obj.name
-                    file_name = os.path.basename(source_path)
-                except:
-                    return f"❌ Não foi possível identificar o arquivo. Formato desconhecido: {type(file_obj)}", update_storage_info()
-            
-            # Garantir que temos apenas o nome do arquivo, não o caminho completo
-            file_name = os.path.basename(file_name)
-            
-            # Log detalhado para depuração
-            print(f"Processando arquivo: {file_name}")
-            print(f"Caminho de origem (temporário): {source_path}")
-            print(f"Tipo do objeto: {type(file_obj)}")
-            
-            # Verificar se o caminho de origem existe e tem conteúdo
-            if not source_path or not os.path.exists(source_path):
-                return f"❌ Caminho temporário do arquivo {file_name} não encontrado.", update_storage_info()
-                
-            if os.path.getsize(source_path) == 0:
-                return f"❌ Arquivo de origem {file_name} está vazio.", update_storage_info()
-            
-            # Verificar formato do arquivo
-            ext = os.path.splitext(file_name)[1].lower()
-            if ext not in ['.pdf', '.docx', '.txt']:
-                return f"⚠️ Formato de arquivo não suportado: {ext}. Use PDF, DOCX ou TXT.", update_storage_info()
-                
-            # Garantir que o diretório de destino exista
-            if not os.path.exists(UPLOAD_DIR):
-                print(f"Recriando diretório de upload: {UPLOAD_DIR}")
-                os.makedirs(UPLOAD_DIR, exist_ok=True)
-            
-            # CORRETO: Definir o caminho final no UPLOAD_DIR usando apenas o nome do arquivo
-            # Importante: Não usar os.path.join com qualquer parte do caminho temporário!
-            final_path = UPLOAD_DIR + os.sep + file_name  # Forçar a concatenação direta
-            
-            print(f"Tentando salvar arquivo em: {final_path}")
-            print(f"Este caminho usa UPLOAD_DIR? {final_path.startswith(UPLOAD_DIR)}")
-            
-            # Método seguro para salvar o arquivo no destino correto
-            try:
-                # Abrir o arquivo de origem e ler todo o conteúdo
-                with open(source_path, 'rb') as src_file:
-                    content = src_file.read()
-                    
-                # Verificar se leu corretamente
-                if not content:
-                    return f"❌ Não foi possível ler o conteúdo do arquivo {file_name}", update_storage_info()
-                    
-                # Escrever o conteúdo no arquivo de destino diretamente
-                with open(final_path, 'wb') as dest_file:
-                    dest_file.write(content)
-                    
-                print(f"Arquivo salvo diretamente em: {final_path}")
-            except Exception as e:
-                print(f"Erro salvando diretamente: {str(e)}")
-                # Tentar outro método se o primeiro falhar
-                try:
-                    shutil.copyfile(source_path, final_path)  # Usar copyfile em vez de copy2
-                    print(f"Arquivo copiado via shutil para: {final_path}")
-                except Exception as e2:
-                    return f"❌ Falha ao copiar o arquivo. Erros: {str(e)} e {str(e2)}", update_storage_info()
-            
-            # Verificar se o arquivo realmente foi salvo no diretório correto
-            if not os.path.exists(final_path):
-                return f"❌ Arquivo não existe após tentativa de cópia: {final_path}", update_storage_info()
-                
-            if os.path.getsize(final_path) == 0:
-                return f"❌ Arquivo salvo mas está vazio: {final_path}", update_storage_info()
-            
-            # Verificar se o arquivo realmente está no diretório UPLOAD_DIR (debug)
-            expected_dir = os.path.dirname(final_path)
-            is_in_upload_dir = os.path.samefile(expected_dir, UPLOAD_DIR) if os.path.exists(expected_dir) and os.path.exists(UPLOAD_DIR) else False
-            print(f"Arquivo está no diretório UPLOAD_DIR? {is_in_upload_dir}")
-            
-            # Listar arquivos no diretório 
-            print(f"Arquivos no UPLOAD_DIR após salvamento:")
-            for f in os.listdir(UPLOAD_DIR):
-                f_path = os.path.join(UPLOAD_DIR, f)
-                print(f" - {f}: {os.path.getsize(f_path)} bytes")
-                
-            print(f"Arquivo salvo com sucesso: {final_path}, Tamanho: {os.path.getsize(final_path)/1024/1024:.2f}MB")
-            
-            # Verificar tamanho do arquivo
-            if os.path.getsize(final_path) > MAX_FILE_SIZE_MB * 1024 * 1024:
-                os.remove(final_path)  # Remover arquivo muito grande
-                return f"⚠️ Arquivo {file_name} excede o limite de {MAX_FILE_SIZE_MB}MB", update_storage_info()
-            
-            # Adicionar à lista de arquivos salvos
-            file_paths.append(final_path)
-            
-        except Exception as e:
-            # Capturar erros detalhados
-            import traceback
-            error_details = traceback.format_exc()
-            return f"❌ Erro ao processar {file_name if 'file_name' in locals() else 'arquivo'}: {str(e)}\n\nDetalhes: {error_details}", update_storage_info()
+    # Salvar os arquivos em paralelo (a cópia libera o GIL durante a E/S)
+    with ThreadPoolExecutor(max_workers=min(8, new_files_count)) as executor:
+        save_results = list(executor.map(_save_one, files))
+    
+    # Separar os arquivos salvos dos erros, sem abortar o lote
+    file_paths = [result for ok, result in save_results if ok]
+    save_errors = [result for ok, result in save_results if not ok]
+    
+    if not file_paths:
+        return "\n".join(save_errors), update_storage_info()
     
-    # Se chegou aqui, todos os arquivos foram salvos
     try:
-        # Garantir que os caminhos para ingest_documents sejam os definitivos
-        results = ingest_documents(file_paths)
+        results = {"success_count": 0, "error_count": 0, "errors": []}
         
-        # Verificar novamente os arquivos após processamento
-        current_size, current_files = get_directory_size()
-        print(f"Estado após processamento: {current_files} arquivos, {current_size:.2f}MB usados")
+        # Indexar em lotes; cada chamada a ingest_documents acrescenta ao banco vetorial
+        for start in range(0, len(file_paths), INGEST_BATCH_SIZE):
+            batch = file_paths[start:start + INGEST_BATCH_SIZE]
+            progress(start / len(file_paths), desc=f"Processando documentos {start + 1}-{start + len(batch)} de {len(file_paths)}")
+            
+            batch_results = ingest_documents(batch)
+            results["success_count"] += batch_results["success_count"]
+            results["error_count"] += batch_results["error_count"]
+            results["errors"].extend(batch_results.get("errors", []))
+            
+            # Liberar o texto e os chunks do lote antes do próximo
+            del batch_results
+            gc.collect()
         
-        # Listar explicitamente todos os arquivos na pasta
-        print("Arquivos encontrados em UPLOAD_DIR após processamento:")
-        for filename in os.listdir(UPLOAD_DIR):
-            file_path = os.path.join(UPLOAD_DIR, filename)
-            print(f" - {filename}: {os.path.getsize(file_path)/1024/1024:.2f}MB")
+        # Verificar novamente os arquivos após processamento (uma única varredura,
+        # compartilhada entre a mensagem e o painel de armazenamento)
+        current_size, current_files = get_directory_size()
+        logger.debug(f"Estado após processamento: {current_files} arquivos, {current_size:.2f}MB usados")
         
-        message = f"✅ {len(files)} arquivo(s) salvo(s) e processado(s) com sucesso!\n\n"
+        message = f"✅ {len(file_paths)} arquivo(s) salvo(s) e processado(s) com sucesso!\n\n"
         message += f"📊 {results['success_count']} processados, {results['error_count']} erros.\n"
         message += f"💾 Uso atual: {current_size:.2f}MB de {MAX_FILE_SIZE_MB}MB ({current_files} de {MAX_FILES} arquivos)\n"
         
@@ -295,51 +458,55 @@ def save_file(files):
             message += "\nErros encontrados:\n"
             for error in results['errors']:
                 message += f"- {error['file_name']}: {error['message']}\n"
+        
+        # Adicionar arquivos que não puderam ser salvos
+        if save_errors:
+            message += "\nArquivos não salvos:\n"
+            for error in save_errors:
+                message += f"- {error}\n"
                 
-        return message, update_storage_info()
+        return message, format_storage_info(current_size, current_files)
     except Exception as e:
         # Arquivo foi salvo mas houve erro no processamento
         import traceback
         error_details = traceback.format_exc()
-        return f"✅ {len(files)} arquivo(s) salvo(s), mas houve erro no processamento: {str(e)}\n\nDetalhes: {error_details}", update_storage_info()
+        return f"✅ {len(file_paths)} arquivo(s) salvo(s), mas houve erro no processamento: {str(e)}\n\nDetalhes: {error_details}", update_storage_info()
 
 def answer_question(question, chat_history):
     """
     Processa uma pergunta do usuário e adiciona a resposta ao histórico de chat.
     
+    A resposta é exibida aos poucos, conforme o modelo a gera.
+    
     Args:
         question: Pergunta do usuário
         chat_history: Histórico atual do chat
     
-    Returns:
+    Yields:
         Histórico de chat atualizado e campo de mensagem limpo
     """
     if not question or question.strip() == "":
-        return chat_history, ""
+        yield chat_history, ""
+        return
     
-    # Adicionar a pergunta do usuário ao histórico
+    # Adicionar a pergunta do usuário ao histórico e exibi-la imediatamente
     chat_history = chat_history + [(question, None)]
+    yield chat_history, ""
     
     try:
-        # Obter resposta do motor de QA
-        result = qa_answer(question)
-        
-        # Extrair a resposta
-        response = result.get("answer", "Desculpe, não consegui processar sua pergunta.")
-        
-        # Atualizar o histórico com a resposta
-        chat_history[-1] = (question, response)
+        # Atualizar o histórico a cada trecho gerado pelo motor de QA
+        for partial in qa_answer_stream(question):
+            chat_history[-1] = (question, partial)
+            yield chat_history, ""
     except Exception as e:
         import traceback
         error_details = traceback.format_exc()
-        print(f"Erro ao processar pergunta: {str(e)}\n{error_details}")
+        logger.error(f"Erro ao processar pergunta: {str(e)}\n{error_details}")
         
         # Em caso de erro, adicionar mensagem de erro ao histórico
         error_message = f"Ocorreu um erro ao processar sua pergunta: {str(e)}"
         chat_history[-1] = (question, error_message)
-    
-    # Retornar o histórico atualizado e limpar o campo de pergunta
-    return chat_history, ""
+        yield chat_history, ""
 
 def get_model_status():
     """
@@ -373,6 +540,15 @@ def get_model_status():
     
     return status
 
+def load_example():
+    """
+    Retorna uma pergunta de exemplo aleatória.
+    
+    Returns:
+        str: Pergunta de exemplo
+    """
+    return random.choice(_EXAMPLES)
+
 # Interface principal do Gradio
 def create_interface():
     """
@@ -388,15 +564,9 @@ def create_interface():
         
         # Aba de Upload de Documentos
         with gr.Tab("Upload de Documentos"):
-            # Estado atual de uso de armazenamento
-            current_size, current_files = get_directory_size()
-            
+            # Estado atual de uso de armazenamento (preenchido ao carregar a página)
             with gr.Row():
-                storage_info = gr.Markdown(
-                    f"### Estado atual do sistema\n"
-                    f"📊 **Uso de armazenamento:** {current_size:.2f}MB de {MAX_FILE_SIZE_MB}MB\n"
-                    f"📁 **Arquivos:** {current_files} de {MAX_FILES}"
-                )
+                storage_info = gr.Markdown("### Carregando...")
                 refresh_btn = gr.Button("🔄 Atualizar", variant="secondary")
             
             with gr.Column():
@@ -404,7 +574,7 @@ def create_interface():
                 files_input = gr.File(
                     file_count="multiple",  # Permitir múltiplos arquivos
                     label=f"Carregar documentos (PDF, DOCX, TXT) - Limite: {MAX_FILES} arquivos, {MAX_FILE_SIZE_MB}MB total",
-                    file_types=["pdf", "docx", "txt", ".pdf", ".docx", ".txt"]  # Tentar diferentes formatos de especificação
+                    file_types=[".pdf", ".docx", ".txt"]  # Gradio >= 3.50 repassa a forma com ponto ao atributo accept do navegador
                 )
                 
                 # Nota sobre gerenciamento de arquivos
@@ -472,15 +642,6 @@ def create_interface():
                 clear_btn = gr.Button("Limpar Conversa", variant="secondary")
                 example_btn = gr.Button("Pergunta Exemplo", variant="secondary")
             
-            # Exemplos de perguntas
-            examples = [
-                "O que é mencionado sobre...?",
-                "Quais são os principais tópicos abordados?",
-                "Poderia resumir o documento?",
-                "Qual é a conclusão do texto sobre...?",
-                "Existe alguma menção a...?"
-            ]
-            
             # Ações dos botões
             submit_btn.click(
                 answer_question, 
@@ -499,10 +660,6 @@ def create_interface():
             clear_btn.click(lambda: [], None, chatbot)
             
             # Inserir exemplo
-            def load_example():
-                import random
-                return random.choice(examples)
-            
             example_btn.click(load_example, None, user_message)
             
             # Informações sobre o chat
@@ -544,6 +701,9 @@ def create_interface():
                 outputs=[model_status]
             )
         
+        # Calcular o uso de armazenamento após a interface estar visível
+        demo.load(update_storage_info, inputs=None, outputs=storage_info)
+        
         # Explicação sobre como funciona
         with gr.Accordion("Como usar o GesonelBot", open=False):
             gr.Markdown("""
@@ -568,6 +728,13 @@ def create_interface():
             **Nota:** Esta é a versão local do GesonelBot, otimizada para funcionar completamente em seu computador.
             """)
     
+    # Habilitar a fila junto com a interface: o gr.Progress de save_file e as respostas
+    # em streaming exigem fila, e ela permite processar uploads e perguntas em paralelo
+    if int(gr.__version__.split(".")[0]) >= 4:
+        demo.queue(default_concurrency_limit=4, max_size=32)
+    else:
+        demo.queue(concurrency_count=4, max_size=32)
+    
     return demo
 
 # Função para iniciar a aplicação